@@ -6,7 +6,9 @@ from typing import Optional, TypeVar, overload
 
 from typing_extensions import ParamSpec
 
+from loopmon.detector import LagAnomalyDetector, StallCallback, StallEvent
 from loopmon.monitor import Callback, EventLoopMonitor, SleepEventLoopMonitor
+from loopmon.snapshot import SnapshotCallback, TaskSnapshot, TaskSnapshotter
 
 _MT = TypeVar('_MT', bound=EventLoopMonitor)
 _MonCon = ParamSpec('_MonCon')
@@ -14,7 +16,13 @@ _MonCon = ParamSpec('_MonCon')
 __all__ = (
     'Callback',
     'EventLoopMonitor',
+    'LagAnomalyDetector',
     'SleepEventLoopMonitor',
+    'SnapshotCallback',
+    'StallCallback',
+    'StallEvent',
+    'TaskSnapshot',
+    'TaskSnapshotter',
     'create',
 )
 
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Optional, Tuple
+
+from typing_extensions import Literal, Protocol, runtime_checkable
+
+
+class StallEvent:
+    """
+    A stall detected by `LagAnomalyDetector`.
+    `kind` is `'start'` when the stall is detected and `'end'` when the lag is back to the baseline.
+    """
+
+    __slots__ = ('kind', 'started_at', 'data_at', 'duration', 'peak_lag', 'baseline', 'suppressed')
+
+    kind: Literal['start', 'end']
+    started_at: datetime
+    data_at: datetime
+    duration: float
+    peak_lag: float
+    baseline: float
+    suppressed: int
+
+    def __init__(
+        self,
+        kind: Literal['start', 'end'],
+        started_at: datetime,
+        data_at: datetime,
+        duration: float,
+        peak_lag: float,
+        baseline: float,
+        suppressed: int,
+    ) -> None:
+        """
+        :param kind: `'start'` or `'end'`.
+        :param started_at: The time the first sample of the stall was collected.
+        :param data_at: The time the sample that emitted this event was collected.
+        :param duration: Seconds from `started_at` to `data_at`.
+        :param peak_lag: The largest lag observed during the stall so far. (seconds)
+        :param baseline: The EWMA of the lag before the stall started. (seconds)
+        :param suppressed: The number of stalls dropped by rate limiting since the previous emitted stall.
+        """
+        self.kind = kind
+        self.started_at = started_at
+        self.data_at = data_at
+        self.duration = duration
+        self.peak_lag = peak_lag
+        self.baseline = baseline
+        self.suppressed = suppressed
+
+    def __repr__(self) -> str:
+        return (
+            f'{type(self).__name__}(kind={self.kind!r}, started_at={self.started_at!r}, '
+            f'duration={self.duration!r}, peak_lag={self.peak_lag!r}, suppressed={self.suppressed!r})'
+        )
+
+
+@runtime_checkable
+class StallCallback(Protocol):
+    async def __call__(self, event: StallEvent) -> None:
+        """
+        A callback function to be called when `LagAnomalyDetector` emits an event.
+
+        :param event: The start or the end of a stall.
+        """
+        pass
+
+
+class LagAnomalyDetector:
+    """
+    A `Callback` that detects stalls from the stream of lag samples of any `EventLoopMonitor`.
+
+    Every sample updates an EWMA baseline and variance of the lag, and a one-sided CUSUM score
+    of how far the lag is above the baseline in units of its standard deviation, all in O(1) without history.
+    The score only accumulates over the current run of consecutive samples above the baseline,
+    and is reset to zero as soon as a sample falls back to it.
+    A stall starts when such a run is at least `min_samples` long and its score reaches `threshold`,
+    so that a single jitter, however large, does not raise an alert.
+    It ends when a sample falls back to the baseline.
+
+    Samples above the baseline do not update it, so that a long stall does not become the new normal.
+    If the lag stays high for `max_duration` seconds, it is regarded as the new normal instead:
+    the stall ends and the baseline is rebuilt from the following samples.
+
+    Each stall emits exactly one `'start'` and one `'end'` event.
+    Stalls starting within `cooldown` seconds of the previous emitted stall are not emitted,
+    and are counted in `StallEvent.suppressed` of the next emitted stall instead.
+
+    Example:
+
+    ```
+    async def alert(event: StallEvent) -> None:
+        print(event)
+
+    async def main():
+        detector = LagAnomalyDetector(callbacks=[alert])
+        loopmon.create(interval=0.01, callbacks=[detector])
+    ```
+    """
+
+    _callbacks: Tuple[StallCallback, ...]
+    _alpha: float
+    _threshold: float
+    _drift: float
+    _min_std: float
+    _warmup: int
+    _min_samples: int
+    _max_duration: float
+    _cooldown: float
+
+    _samples: int
+    _mean: float
+    _var: float
+    _score: float
+    _above_since: Optional[datetime]
+    _above_samples: int
+    _started_at: Optional[datetime]
+    _peak_lag: float
+    _emitting: bool
+    _last_emitted_at: Optional[float]
+    _suppressed: int
+
+    def __init__(
+        self,
+        callbacks: Iterable[StallCallback] = (),
+        alpha: float = 0.05,
+        threshold: float = 5,
+        drift: float = 0.5,
+        min_std: float = 0.001,
+        warmup: int = 10,
+        min_samples: int = 3,
+        max_duration: float = 300,
+        cooldown: float = 60,
+    ) -> None:
+        """
+        :param callbacks: Callback functions to process stall events.
+        :param alpha: Smoothing factor of the EWMA baseline and variance. Must be in (0, 1].
+        :param threshold: The CUSUM score (in standard deviations) at which a stall starts.
+        :param drift: Standard deviations above the baseline that are tolerated without raising the score.
+        :param min_std: Lower bound of the standard deviation, so that a perfectly idle loop is not too sensitive.
+        (seconds)
+        :param warmup: The number of samples used only to build the baseline before detecting.
+        :param min_samples: The number of consecutive samples above the baseline required to start a stall.
+        :param max_duration: How long a stall can last before its lag is regarded as the new baseline. (seconds)
+        :param cooldown: Minimum time between starts of two emitted stalls. (seconds)
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError('`alpha` must be in (0, 1]')
+        if threshold <= 0:
+            raise ValueError('`threshold` must be positive')
+        if drift < 0:
+            raise ValueError('`drift` must not be negative')
+        if min_std <= 0:
+            raise ValueError('`min_std` must be positive')
+        if warmup < 0:
+            raise ValueError('`warmup` must not be negative')
+        if min_samples <= 0:
+            raise ValueError('`min_samples` must be positive')
+        if max_duration <= 0:
+            raise ValueError('`max_duration` must be positive')
+        if cooldown < 0:
+            raise ValueError('`cooldown` must not be negative')
+
+        self._callbacks = tuple(callbacks)
+        self._alpha = alpha
+        self._threshold = threshold
+        self._drift = drift
+        self._min_std = min_std
+        self._warmup = warmup
+        self._min_samples = min_samples
+        self._max_duration = max_duration
+        self._cooldown = cooldown
+
+        self._samples = 0
+        self._mean = 0
+        self._var = 0
+        self._score = 0
+        self._above_since = None
+        self._above_samples = 0
+        self._started_at = None
+        self._peak_lag = 0
+        self._emitting = False
+        self._last_emitted_at = None
+        self._suppressed = 0
+
+    @property
+    def baseline(self) -> float:
+        """
+        The EWMA of the lag. (seconds)
+        """
+        return self._mean
+
+    @property
+    def std(self) -> float:
+        """
+        The EWMA standard deviation of the lag, not smaller than `min_std`. (seconds)
+        """
+        return max(math.sqrt(self._var), self._min_std)
+
+    @property
+    def score(self) -> float:
+        """
+        The CUSUM score of the current run of samples above the baseline, in standard deviations.
+        """
+        return self._score
+
+    @property
+    def stalled(self) -> bool:
+        """
+        A value indicating whether a stall is in progress.
+        """
+        return self._started_at is not None
+
+    def _update_baseline(self, lag: float) -> None:
+        if self._samples == 0:
+            self._mean = lag
+            self._var = 0
+        else:
+            diff = lag - self._mean
+            incr = self._alpha * diff
+            self._mean += incr
+            self._var = (1 - self._alpha) * (self._var + diff * incr)
+        self._samples += 1
+
+    async def __call__(self, lag: float, tasks: int, data_at: datetime) -> None:
+        if self._samples < self._warmup:
+            self._update_baseline(lag)
+            return
+
+        z = (lag - self._mean) / self.std
+
+        if self._started_at is not None:
+            self._peak_lag = max(self._peak_lag, lag)
+            if z <= self._drift:
+                self._end(self._started_at, data_at)
+                self._update_baseline(lag)
+            elif (data_at - self._started_at).total_seconds() >= self._max_duration:
+                self._end(self._started_at, data_at)
+                # the lag did not come back, so rebuild the baseline from the current level
+                self._samples = 0
+                self._update_baseline(lag)
+            return
+
+        if z <= self._drift:
+            self._score = 0
+            self._above_since = None
+            self._above_samples = 0
+            self._update_baseline(lag)
+            return
+
+        self._score += z - self._drift
+        if self._above_since is None:
+            self._above_since = data_at
+            self._peak_lag = lag
+        self._above_samples += 1
+        self._peak_lag = max(self._peak_lag, lag)
+
+        if self._score >= self._threshold and self._above_samples >= self._min_samples:
+            self._start(self._above_since, data_at)
+
+    def _start(self, started_at: datetime, data_at: datetime) -> None:
+        self._started_at = started_at
+        self._above_since = None
+        self._above_samples = 0
+
+        now = asyncio.get_running_loop().time()
+        self._emitting = self._last_emitted_at is None or now - self._last_emitted_at >= self._cooldown
+        if self._emitting:
+            self._last_emitted_at = now
+            self._emit('start', started_at, data_at)
+        else:
+            self._suppressed += 1
+
+    def _end(self, started_at: datetime, data_at: datetime) -> None:
+        if self._emitting:
+            self._emit('end', started_at, data_at)
+            self._suppressed = 0
+        self._started_at = None
+        self._score = 0
+        self._emitting = False
+
+    def _emit(self, kind: Literal['start', 'end'], started_at: datetime, data_at: datetime) -> None:
+        event = StallEvent(
+            kind,
+            started_at,
+            data_at,
+            (data_at - started_at).total_seconds(),
+            self._peak_lag,
+            self._mean,
+            self._suppressed,
+        )
+        loop = asyncio.get_running_loop()
+        for c in self._callbacks:
+            loop.create_task(c(event))
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from typing_extensions import Protocol, runtime_checkable
+
+AwaitChain = Tuple[str, ...]
+
+
+class TaskSnapshot:
+    """
+    Where every pending task of the event loop was suspended when the snapshot was taken,
+    grouped by await chain and sorted by the number of tasks in descending order.
+    """
+
+    __slots__ = ('lag', 'tasks', 'data_at', 'chains')
+
+    lag: float
+    tasks: int
+    data_at: datetime
+    chains: List[Tuple[AwaitChain, int]]
+
+    def __init__(self, lag: float, tasks: int, data_at: datetime, chains: List[Tuple[AwaitChain, int]]) -> None:
+        """
+        :param lag: The lag of the sample that triggered this snapshot.
+        :param tasks: The number of tasks of the sample that triggered this snapshot.
+        :param data_at: The time the triggering sample was collected.
+        :param chains: Pairs of await chain (outermost coroutine first) and the number of tasks suspended on it.
+        """
+        self.lag = lag
+        self.tasks = tasks
+        self.data_at = data_at
+        self.chains = chains
+
+    def __repr__(self) -> str:
+        return (
+            f'{type(self).__name__}(lag={self.lag!r}, tasks={self.tasks!r}, data_at={self.data_at!r}, '
+            f'chains={len(self.chains)})'
+        )
+
+
+@runtime_checkable
+class SnapshotCallback(Protocol):
+    async def __call__(self, snapshot: TaskSnapshot) -> None:
+        """
+        A callback function to be called after `TaskSnapshotter` finished a snapshot.
+
+        :param snapshot: The grouped await chains of the pending tasks.
+        """
+        pass
+
+
+def _frame_of(awaitable: Any) -> Optional[str]:
+    code = getattr(awaitable, 'cr_code', None) or getattr(awaitable, 'gi_code', None)
+    if code is None:
+        return None
+
+    name = getattr(code, 'co_qualname', code.co_name)
+    frame = getattr(awaitable, 'cr_frame', None) or getattr(awaitable, 'gi_frame', None)
+    lineno = code.co_firstlineno if frame is None else frame.f_lineno
+    return f'{name} ({code.co_filename}:{lineno})'
+
+
+def await_chain(task: asyncio.Task[Any]) -> AwaitChain:
+    """
+    Walks `cr_await` (or `gi_yieldfrom` for generator based coroutines) from the coroutine of `task`
+    and returns where each coroutine of the chain is suspended, outermost coroutine first.
+    The innermost awaitable that is not a coroutine is represented by its type name.
+    For a future it is the type of its iterator (e.g. `FutureIter` with the C accelerated `asyncio`),
+    because the future itself can not be reached from the iterator.
+
+    Falls back to `Task.get_stack()` if the task wraps a coroutine that can not be walked.
+
+    :param task: A pending task.
+    :return: The await chain of `task`.
+    """
+
+    if sys.version_info >= (3, 8, 0):
+        awaitable = task.get_coro()
+    else:
+        awaitable = task._coro  # type: ignore[attr-defined]
+    frame = _frame_of(awaitable)
+    if frame is None:
+        return tuple(f'{f.f_code.co_name} ({f.f_code.co_filename}:{f.f_lineno})' for f in task.get_stack())
+
+    chain: List[str] = []
+    while frame is not None:
+        chain.append(frame)
+        awaitable = getattr(awaitable, 'cr_await', None) or getattr(awaitable, 'gi_yieldfrom', None)
+        frame = _frame_of(awaitable)
+
+    if awaitable is not None:
+        chain.append(type(awaitable).__qualname__)
+    return tuple(chain)
+
+
+class TaskSnapshotter:
+    """
+    A `Callback` that takes a snapshot of where every pending task is suspended when a stall
+    or a runaway number of tasks is detected, and delivers it to `callbacks`.
+
+    Tasks are walked `chunk_size` at a time, yielding to the event loop between chunks,
+    so that a snapshot of a huge number of tasks does not block the loop by itself.
+    At most one snapshot is taken at a time, and at most one snapshot is started per `min_interval` seconds.
+
+    Example:
+
+    ```
+    async def print_snapshot(snapshot: TaskSnapshot) -> None:
+        for chain, count in snapshot.chains[:5]:
+            print(count, ' -> '.join(chain))
+
+    async def main():
+        snapshotter = TaskSnapshotter(lag_threshold=0.5, callbacks=[print_snapshot])
+        loopmon.create(callbacks=[snapshotter])
+    ```
+    """
+
+    _lag_threshold: Optional[float]
+    _tasks_threshold: Optional[int]
+    _callbacks: Tuple[SnapshotCallback, ...]
+    _min_interval: float
+    _chunk_size: int
+    _last_started_at: Optional[float]
+    _in_progress: bool
+
+    def __init__(
+        self,
+        lag_threshold: Optional[float] = None,
+        tasks_threshold: Optional[int] = None,
+        callbacks: Iterable[SnapshotCallback] = (),
+        min_interval: float = 60,
+        chunk_size: int = 1000,
+    ) -> None:
+        """
+        :param lag_threshold: Takes a snapshot when the measured lag is greater than or equal to it. (seconds)
+        :param tasks_threshold: Takes a snapshot when the number of tasks is greater than or equal to it.
+        :param callbacks: Callback functions to process finished snapshots.
+        :param min_interval: Minimum time between starts of two snapshots. (seconds)
+        :param chunk_size: How many tasks are walked before yielding to the event loop.
+        """
+        if lag_threshold is None and tasks_threshold is None:
+            raise ValueError('At least one of `lag_threshold` or `tasks_threshold` must be specified')
+        if chunk_size <= 0:
+            raise ValueError('`chunk_size` must be positive')
+
+        self._lag_threshold = lag_threshold
+        self._tasks_threshold = tasks_threshold
+        self._callbacks = tuple(callbacks)
+        self._min_interval = min_interval
+        self._chunk_size = chunk_size
+        self._last_started_at = None
+        self._in_progress = False
+
+    @property
+    def in_progress(self) -> bool:
+        """
+        A value indicating whether a snapshot is being taken now.
+        """
+        return self._in_progress
+
+    def _triggered(self, lag: float, tasks: int) -> bool:
+        if self._lag_threshold is not None and lag >= self._lag_threshold:
+            return True
+        return self._tasks_threshold is not None and tasks >= self._tasks_threshold
+
+    async def __call__(self, lag: float, tasks: int, data_at: datetime) -> None:
+        if self._in_progress or not self._triggered(lag, tasks):
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._last_started_at is not None and now - self._last_started_at < self._min_interval:
+            return
+
+        self._last_started_at = now
+        self._in_progress = True
+        try:
+            snapshot = TaskSnapshot(lag, tasks, data_at, await self._take(loop))
+        finally:
+            self._in_progress = False
+
+        for c in self._callbacks:
+            loop.create_task(c(snapshot))
+
+    async def _take(self, loop: asyncio.AbstractEventLoop) -> List[Tuple[AwaitChain, int]]:
+        current = asyncio.current_task(loop)
+        pending = [t for t in asyncio.all_tasks(loop) if t is not current]
+        counter: Counter[AwaitChain] = Counter()
+
+        for begin in range(0, len(pending), self._chunk_size):
+            if begin:
+                await asyncio.sleep(0)
+            for t in pending[begin : begin + self._chunk_size]:
+                if not t.done():
+                    counter[await_chain(t)] += 1
+
+        return counter.most_common()
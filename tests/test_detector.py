@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import pytest
+from pytest_mock import MockerFixture
+
+import loopmon
+
+
+async def _feed(detector: loopmon.LagAnomalyDetector, lags: List[float], interval: float = 0.01) -> None:
+    now = datetime.now(timezone.utc)
+    for i, lag in enumerate(lags):
+        await detector(lag, 1, now + timedelta(seconds=i * interval))
+    await asyncio.sleep(0)
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    (
+        dict(alpha=0),
+        dict(threshold=0),
+        dict(drift=-1),
+        dict(min_std=0),
+        dict(warmup=-1),
+        dict(min_samples=0),
+        dict(max_duration=0),
+        dict(cooldown=-1),
+    ),
+)
+def test_can_not_create_with_invalid_parameter(kwargs: Dict[str, float]) -> None:
+    with pytest.raises(ValueError):
+        loopmon.LagAnomalyDetector(**kwargs)
+
+
+def test_can_ignore_noise(mocker: MockerFixture) -> None:
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        detector = loopmon.LagAnomalyDetector(callbacks=(mock,))
+        await _feed(detector, [0.001, 0.002] * 50)
+
+        mock.assert_not_awaited()
+        assert not detector.stalled
+
+    asyncio.run(_inner())
+
+
+def test_can_emit_start_and_end_of_stall(mocker: MockerFixture) -> None:
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        detector = loopmon.LagAnomalyDetector(callbacks=(mock,))
+        await _feed(detector, [0.001] * 20 + [0.5, 0.8, 0.3] + [0.001] * 5)
+
+        assert not detector.stalled
+        assert mock.await_count == 2
+        start, end = (c.args[0] for c in mock.await_args_list)
+        assert start.kind == 'start'
+        assert end.kind == 'end'
+        assert end.started_at == start.started_at
+        assert end.peak_lag == 0.8
+        assert end.duration == pytest.approx(0.03)
+
+    asyncio.run(_inner())
+
+
+def test_can_ignore_isolated_spike(mocker: MockerFixture) -> None:
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        detector = loopmon.LagAnomalyDetector(callbacks=(mock,))
+        # the spike alone crosses `threshold`, and must not leave its score to the small rise afterwards
+        await _feed(detector, [0.0005] * 20 + [0.5] + [0.0005] * 50 + [0.0012] * 3 + [0.0005] * 5)
+
+        mock.assert_not_awaited()
+        assert not detector.stalled
+
+    asyncio.run(_inner())
+
+
+def test_can_end_lasting_stall(mocker: MockerFixture) -> None:
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        detector = loopmon.LagAnomalyDetector(callbacks=(mock,), max_duration=5)
+        await _feed(detector, [0.001] * 20 + [0.05] * 2000)
+
+        assert not detector.stalled
+        assert detector.baseline == pytest.approx(0.05)
+        assert [c.args[0].kind for c in mock.await_args_list] == ['start', 'end']
+        assert mock.await_args.args[0].duration == pytest.approx(5)
+
+    asyncio.run(_inner())
+
+
+def test_can_rate_limit_stalls(mocker: MockerFixture) -> None:
+    stall = [0.5] * 3 + [0.001]
+
+    async def _inner() -> None:
+        loop = asyncio.get_running_loop()
+        now = mocker.patch.object(loop, 'time', return_value=0)
+        mock = mocker.AsyncMock()
+        detector = loopmon.LagAnomalyDetector(callbacks=(mock,), cooldown=60)
+        await _feed(detector, [0.001] * 20 + stall)
+        assert mock.await_count == 2
+
+        now.return_value = 10
+        await _feed(detector, stall)
+        now.return_value = 20
+        await _feed(detector, stall)
+        assert mock.await_count == 2
+
+        now.return_value = 70
+        await _feed(detector, stall)
+        assert mock.await_count == 4
+        assert mock.await_args.args[0].suppressed == 2
+
+    asyncio.run(_inner())
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from pytest_mock import MockerFixture
+
+import loopmon
+from loopmon.snapshot import await_chain
+
+
+async def _wait_lock(lock: asyncio.Lock) -> None:
+    async with lock:
+        pass
+
+
+def test_can_not_create_without_threshold() -> None:
+    with pytest.raises(ValueError):
+        loopmon.TaskSnapshotter()
+
+
+def test_can_not_create_with_non_positive_chunk_size() -> None:
+    with pytest.raises(ValueError):
+        loopmon.TaskSnapshotter(lag_threshold=0.1, chunk_size=0)
+
+
+def test_can_walk_await_chain() -> None:
+    async def _inner() -> None:
+        lock = asyncio.Lock()
+        await lock.acquire()
+        task = asyncio.get_running_loop().create_task(_wait_lock(lock))
+        await asyncio.sleep(0)
+
+        chain = await_chain(task)
+        assert '_wait_lock' in chain[0]
+        assert any('acquire' in frame and 'locks.py' in frame for frame in chain)
+
+        lock.release()
+        await task
+
+    asyncio.run(_inner())
+
+
+def test_can_group_tasks_by_await_chain(mocker: MockerFixture) -> None:
+    waiters = 25
+
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        snapshotter = loopmon.TaskSnapshotter(tasks_threshold=waiters, callbacks=(mock,), chunk_size=10)
+
+        lock = asyncio.Lock()
+        await lock.acquire()
+        tasks = [asyncio.get_running_loop().create_task(_wait_lock(lock)) for _ in range(waiters)]
+        await asyncio.sleep(0)
+
+        await snapshotter(0, waiters, datetime.now(timezone.utc))
+        assert not snapshotter.in_progress
+        await asyncio.sleep(0)
+
+        mock.assert_awaited_once()
+        snapshot: loopmon.TaskSnapshot = mock.await_args.args[0]
+        chain, count = snapshot.chains[0]
+        assert count == waiters
+        assert '_wait_lock' in chain[0]
+
+        lock.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_inner())
+
+
+def test_can_rate_limit_snapshots(mocker: MockerFixture) -> None:
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        snapshotter = loopmon.TaskSnapshotter(lag_threshold=0.1, callbacks=(mock,), min_interval=60)
+
+        await snapshotter(0.05, 1, datetime.now(timezone.utc))
+        await snapshotter(0.2, 1, datetime.now(timezone.utc))
+        await snapshotter(0.3, 1, datetime.now(timezone.utc))
+        await asyncio.sleep(0)
+
+        mock.assert_awaited_once()
+        assert mock.await_args.args[0].lag == 0.2
+
+    asyncio.run(_inner())
+
+
+def test_can_yield_to_loop_between_chunks(mocker: MockerFixture) -> None:
+    waiters = 30
+
+    async def _inner() -> None:
+        mock = mocker.AsyncMock()
+        snapshotter = loopmon.TaskSnapshotter(tasks_threshold=waiters, callbacks=(mock,), chunk_size=10)
+
+        lock = asyncio.Lock()
+        await lock.acquire()
+        tasks = [asyncio.get_running_loop().create_task(_wait_lock(lock)) for _ in range(waiters)]
+        await asyncio.sleep(0)
+
+        snapshot_task = asyncio.get_running_loop().create_task(snapshotter(0, waiters, datetime.now(timezone.utc)))
+        # Let the snapshot walk its first chunk, then this coroutine must get the loop back before it finishes
+        await asyncio.sleep(0)
+        assert snapshotter.in_progress
+        mock.assert_not_awaited()
+
+        await snapshot_task
+        assert not snapshotter.in_progress
+        await asyncio.sleep(0)
+        mock.assert_awaited_once()
+
+        lock.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_inner())